@@ -1,15 +1,22 @@
+from __future__ import annotations
+
 import os
 import re
-import yaml
+import json
+import asyncio
 import argparse
-import requests
+import functools
 import hashlib
 import logging
 import random
-import time
+import shutil
+import sqlite3
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Callable, Optional, List, Dict, Set, Tuple, Any
+from concurrent.futures import ThreadPoolExecutor
 
 # Logging setup
 logging.basicConfig(
@@ -19,12 +26,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Try importing the new OpenAI client
-try:
+# Heavy third-party modules are imported on first use so --help and config errors return quickly
+if TYPE_CHECKING:
+    import httpx
     from openai import OpenAI
-except ImportError:
-    OpenAI = None
-    logger.warning("OpenAI package (new interface) not installed; openai provider will not work.")
+
+
+@functools.lru_cache(maxsize=None)
+def get_openai_class():
+    """
+    Imports and returns the new OpenAI client class, or None if the package is missing.
+    """
+    try:
+        from openai import OpenAI
+    except ImportError:
+        logger.warning("OpenAI package (new interface) not installed; openai provider will not work.")
+        return None
+    return OpenAI
+
+
+@functools.lru_cache(maxsize=None)
+def get_httpx():
+    """Imports and returns the httpx module."""
+    import httpx
+    return httpx
+
+
+# Patterns used to clean question lines, compiled once
+LEADING_BULLET_PATTERN = re.compile(r'^[\d\.\-\+\*]+\s*')
+ASTERISKS_PATTERN = re.compile(r'\*+')
+
+# Shared async HTTP client for Ollama requests, created in main once the thread count is known
+http_client: Optional[httpx.AsyncClient] = None
+
+# Legacy completions default to 16 tokens, far too short for an answer
+DEFAULT_COMPLETION_MAX_TOKENS = 1024
+
+# The Batch API calls have no retry loop of their own, so they keep the SDK's retries
+BATCH_MAX_RETRIES = 5
+
+# Per-batch limits of the OpenAI Batch API; larger runs are split across several batches
+BATCH_MAX_REQUESTS = 50_000
+BATCH_MAX_INPUT_BYTES = 200 * 1000 * 1000
+
+# Per-key locks so concurrent identical prompts only call the API once
+cache_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+@dataclass(frozen=True)
+class FileGroupConfig:
+    """
+    A validated entry from the config's file_groups section.
+    """
+    files: Tuple[str, ...] = ()
+    file_header: str = ""
+    question_prompt: str = ""
+    answer_prompt: str = ""
+    question_instruction_list: Tuple[str, ...] = ()
+    answer_instruction_list: Tuple[str, ...] = ()
+    generate_question_list: Tuple[str, ...] = ()
+    iterations: int = 1
+
+    @classmethod
+    def from_dict(cls, group_name: str, raw: Any) -> FileGroupConfig:
+        """
+        Checks the shape of a raw file group entry once, raising ValueError if it is malformed.
+        """
+        if not isinstance(raw, dict):
+            raise ValueError(f"File group '{group_name}' must be a mapping.")
+
+        def string_list(key: str) -> Tuple[str, ...]:
+            value = raw.get(key, [])
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ValueError(f"File group '{group_name}': '{key}' must be a list of strings.")
+            return tuple(value)
+
+        def string(key: str) -> str:
+            value = raw.get(key, "")
+            if not isinstance(value, str):
+                raise ValueError(f"File group '{group_name}': '{key}' must be a string.")
+            return value
+
+        iterations = raw.get("iterations", 1)
+        if not isinstance(iterations, int) or iterations < 1:
+            raise ValueError(f"File group '{group_name}': 'iterations' must be a positive integer.")
+
+        return cls(
+            files=string_list("files"),
+            file_header=string("file_header"),
+            question_prompt=string("question_prompt"),
+            answer_prompt=string("answer_prompt"),
+            question_instruction_list=string_list("question_instruction_list"),
+            answer_instruction_list=string_list("answer_instruction_list"),
+            generate_question_list=string_list("generate_question_list"),
+            iterations=iterations
+        )
 
 
 def get_item_by_name(item_list: List[Dict[str, Any]], name: str) -> Optional[Dict[str, Any]]:
@@ -38,78 +134,468 @@ def get_item_by_name(item_list: List[Dict[str, Any]], name: str) -> Optional[Dic
 
 
 # --- Helper Functions ---
-def call_api(
+def stream_openai_to_file(openai_client: OpenAI, model: str, prompt: str, file_path: Path) -> bool:
+    """
+    Streams an OpenAI chat completion into file_path chunk by chunk.
+    Returns True if any content was written.
+    """
+    stream = openai_client.chat.completions.create(
+        messages=[{"role": "user", "content": prompt}],
+        model=model,
+        stream=True
+    )
+    has_content = False
+    with open(file_path, "w", encoding="utf-8") as f:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                f.write(chunk.choices[0].delta.content)
+                has_content = True
+    return has_content
+
+
+async def call_api_async(
     provider: str,
     model: str,
     prompt: str,
+    output_path: Path,
+    semaphore: asyncio.Semaphore,
     global_ollama_url: Optional[str] = None,
     openai_client: Optional[OpenAI] = None
-) -> Optional[str]:
+) -> bool:
     """
-    Calls the appropriate API (OpenAI or Ollama) using the selected model and prompt.
+    Calls the appropriate API (OpenAI or Ollama) using the selected model and prompt,
+    streaming the response into output_path instead of holding it in memory.
+    The file is only moved into place once the full response has arrived.
+    The semaphore bounds how many requests are in flight at once.
     Implements an exponential backoff strategy for handling transient failures.
+    Returns True if a non-empty response was written.
     """
     max_retries = 5
     backoff_factor = 1  # Base backoff time in seconds
 
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # A unique temp name per call, so concurrent writers of the same path never share one
+    tmp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex}.tmp")
+
     if provider.lower() == "openai":
         if not openai_client:
             logger.error("OpenAI client is not initialized. Cannot generate via openai provider.")
-            return None
+            return False
 
         attempt = 0
         while attempt <= max_retries:
             try:
-                # Using your new `openai` library code
-                response = openai_client.chat.completions.create(
-                    messages=[{"role": "user", "content": prompt}],
-                    model=model
-                )
-                return response.choices[0].message.content
+                # The OpenAI client is synchronous, so stream it off the event loop
+                async with semaphore:
+                    has_content = await asyncio.to_thread(
+                        stream_openai_to_file, openai_client, model, prompt, tmp_path
+                    )
+                if not has_content:
+                    tmp_path.unlink(missing_ok=True)
+                    return False
+                os.replace(tmp_path, output_path)
+                return True
 
             except Exception as e:
                 logger.error(f"OpenAI API error on attempt {attempt+1}/{max_retries}: {e}")
                 if attempt == max_retries:
-                    return None
+                    tmp_path.unlink(missing_ok=True)
+                    return False
                 sleep_time = backoff_factor * (2 ** attempt) + random.uniform(0, 1)
                 logger.info(f"Retrying OpenAI API call in {sleep_time:.2f} seconds...")
-                time.sleep(sleep_time)
+                await asyncio.sleep(sleep_time)
                 attempt += 1
 
     elif provider.lower() == "ollama":
         if not global_ollama_url:
             logger.error("Global Ollama URL is not provided.")
-            return None
+            return False
 
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "options": {}
         }
         attempt = 0
         while attempt <= max_retries:
             try:
-                response = requests.post(global_ollama_url, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                return result.get("response", "").strip()
+                has_content = False
+                # Trailing whitespace is held back until more text follows, so it is
+                # dropped at the end of the response, matching the old strip()
+                pending_whitespace = ""
+                async with semaphore:
+                    async with http_client.stream("POST", global_ollama_url, json=payload) as response:
+                        response.raise_for_status()
+                        with open(tmp_path, "w", encoding="utf-8") as f:
+                            # Ollama streams one JSON object per line
+                            async for line in response.aiter_lines():
+                                if not line.strip():
+                                    continue
+                                chunk = json.loads(line)
+                                if "error" in chunk:
+                                    raise RuntimeError(chunk["error"])
+                                text = chunk.get("response", "")
+                                if not has_content:
+                                    # Skip leading whitespace, matching the old strip()
+                                    text = text.lstrip()
+                                body = text.rstrip()
+                                if body:
+                                    f.write(pending_whitespace + body)
+                                    pending_whitespace = text[len(body):]
+                                    has_content = True
+                                elif has_content:
+                                    pending_whitespace += text
+                if not has_content:
+                    tmp_path.unlink(missing_ok=True)
+                    return False
+                os.replace(tmp_path, output_path)
+                return True
 
             except Exception as e:
                 logger.error(f"Ollama API error on attempt {attempt+1}/{max_retries}: {e}")
                 if attempt == max_retries:
-                    return None
+                    tmp_path.unlink(missing_ok=True)
+                    return False
                 sleep_time = backoff_factor * (2 ** attempt) + random.uniform(0, 1)
                 logger.info(f"Retrying Ollama API call in {sleep_time:.2f} seconds...")
-                time.sleep(sleep_time)
+                await asyncio.sleep(sleep_time)
                 attempt += 1
 
     else:
         logger.error(f"Unknown provider specified: {provider}")
-        return None
+        return False
+
+
+async def batch_call_api(
+    model: str,
+    prompts: List[str],
+    output_paths: List[Path],
+    semaphore: asyncio.Semaphore,
+    openai_client: Optional[OpenAI] = None,
+    max_tokens: int = DEFAULT_COMPLETION_MAX_TOKENS
+) -> List[bool]:
+    """
+    Sends several prompts to the OpenAI legacy completions endpoint in one request,
+    which accepts a list of prompts, and writes each response to the matching cache path.
+    Each write holds that cache entry's lock, like cached_call_api does.
+    Responses cut off by max_tokens are not cached, since the cache never invalidates.
+    Returns whether each response was written.
+    """
+    max_retries = 5
+    backoff_factor = 1  # Base backoff time in seconds
+
+    if not openai_client:
+        logger.error("OpenAI client is not initialized. Cannot generate via openai provider.")
+        return [False] * len(prompts)
+
+    attempt = 0
+    while attempt <= max_retries:
+        try:
+            async with semaphore:
+                response = await asyncio.to_thread(
+                    openai_client.completions.create,
+                    model=model,
+                    prompt=prompts,
+                    max_tokens=max_tokens
+                )
+            break
+
+        except Exception as e:
+            logger.error(f"OpenAI API error on attempt {attempt+1}/{max_retries}: {e}")
+            if attempt == max_retries:
+                return [False] * len(prompts)
+            sleep_time = backoff_factor * (2 ** attempt) + random.uniform(0, 1)
+            logger.info(f"Retrying OpenAI API call in {sleep_time:.2f} seconds...")
+            await asyncio.sleep(sleep_time)
+            attempt += 1
+
+    # Choices are not guaranteed to come back in order, so match them to prompts by index
+    generated = [False] * len(prompts)
+    for choice in response.choices:
+        if choice.finish_reason == "length":
+            logger.warning(
+                f"Completion for prompt {choice.index + 1}/{len(prompts)} was cut off at max_tokens={max_tokens}; "
+                f"not caching it. Raise max_tokens to keep answers this long."
+            )
+            continue
+        text = choice.text.strip()
+        if text:
+            output_path = output_paths[choice.index]
+            async with cache_locks[output_path.name]:
+                write_text_atomic(output_path, text)
+            generated[choice.index] = True
+    return generated
+
+
+def get_cache_path(cache_dir: Path, provider: str, model: str, namespace: str, prompt: str) -> Path:
+    """
+    Returns the on-disk cache location for a response, keyed by the SHA-256 of provider, model and prompt.
+    The namespace (the expanded group name) keeps each iteration sampling its own responses.
+    """
+    key = get_hash(f"{provider.lower()}|{model}|{namespace}|{prompt}")
+    return cache_dir / key[:2] / key[2:]
+
+
+async def cached_call_api(
+    provider: str,
+    model: str,
+    prompt: str,
+    output_path: Path,
+    semaphore: asyncio.Semaphore,
+    cache_dir: Path,
+    namespace: str,
+    global_ollama_url: Optional[str] = None,
+    openai_client: Optional[OpenAI] = None
+) -> bool:
+    """
+    Wraps call_api_async with a persistent prompt -> response cache so repeated prompts
+    (within a run or across re-runs) skip the API call entirely.
+    Responses are streamed into the cache and then copied to output_path.
+    """
+    cache_path = get_cache_path(cache_dir, provider, model, namespace, prompt)
+    # Identical prompts within a group share a cache key, so whichever caller takes the lock
+    # first generates the response and the rest wait for it and copy it, with no extra request
+    async with cache_locks[cache_path.name]:
+        if not cache_path.exists():
+            generated = await call_api_async(
+                provider=provider,
+                model=model,
+                prompt=prompt,
+                output_path=cache_path,
+                semaphore=semaphore,
+                global_ollama_url=global_ollama_url,
+                openai_client=openai_client
+            )
+            if not generated:
+                return False
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(cache_path, output_path)
+    return True
+
+
+def download_batch_output(openai_client: OpenAI, output_file_id: str, output_paths: Dict[str, Path]) -> Set[str]:
+    """
+    Streams a batch output file line by line, writing each answer to its output path.
+    Returns the custom_ids that completed successfully.
+    """
+    completed = set()
+    with openai_client.files.with_streaming_response.content(output_file_id) as response:
+        for line in response.iter_lines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            result = record.get("response") or {}
+            if result.get("status_code") != 200 or custom_id not in output_paths:
+                logger.error(f"OpenAI batch request {custom_id} failed: {record.get('error')}")
+                continue
+            write_text_atomic(output_paths[custom_id], result["body"]["choices"][0]["message"]["content"])
+            completed.add(custom_id)
+    return completed
+
+
+def write_batch_inputs(model: str, prompts: Dict[str, str], batch_input_path: Path) -> List[Tuple[Path, List[str]]]:
+    """
+    Writes the prompts as Batch API requests in JSONL, starting a new part file whenever the next
+    request would go over the per-batch request count or input file size limit.
+    Returns each part's path with the custom_ids it holds.
+    """
+    batch_input_path.parent.mkdir(parents=True, exist_ok=True)
+    parts: List[Tuple[Path, List[str]]] = []
+    part_file = None
+    part_bytes = 0
+    try:
+        for custom_id, prompt in prompts.items():
+            request = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": [{"role": "user", "content": prompt}]
+                }
+            }
+            # Count the serialized bytes, since each request carries the group's full file content
+            line = (json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8")
+            if (
+                part_file is None
+                or len(parts[-1][1]) >= BATCH_MAX_REQUESTS
+                or part_bytes + len(line) > BATCH_MAX_INPUT_BYTES
+            ):
+                if part_file:
+                    part_file.close()
+                part_path = batch_input_path.with_name(
+                    f"{batch_input_path.stem}_{len(parts) + 1}{batch_input_path.suffix}"
+                )
+                part_file = open(part_path, "wb")
+                parts.append((part_path, []))
+                part_bytes = 0
+            part_file.write(line)
+            part_bytes += len(line)
+            parts[-1][1].append(custom_id)
+    finally:
+        if part_file:
+            part_file.close()
+    return parts
+
+
+async def wait_for_batch(
+    batch_client: OpenAI,
+    batch_id: str,
+    output_paths: Dict[str, Path],
+    poll_interval: int = 30
+) -> Set[str]:
+    """
+    Polls a submitted batch until it reaches a terminal state, then downloads its output.
+    Returns the custom_ids that succeeded. Download errors are raised so the batch can be resumed.
+    """
+    while True:
+        try:
+            batch = await asyncio.to_thread(batch_client.batches.retrieve, batch_id)
+        except Exception as e:
+            logger.error(f"Failed to poll OpenAI batch {batch_id}: {e}")
+        else:
+            logger.info(f"OpenAI batch {batch.id} status: {batch.status}")
+            if batch.status in ("completed", "failed", "expired", "cancelled"):
+                break
+        await asyncio.sleep(poll_interval)
+
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.error(f"OpenAI batch {batch.id} finished with status '{batch.status}' and no output.")
+        return set()
+
+    # Demultiplex the output file back to custom_ids
+    logger.info(f"OpenAI batch {batch.id} completed with output file {batch.output_file_id}.")
+    return await asyncio.to_thread(download_batch_output, batch_client, batch.output_file_id, output_paths)
+
+
+def load_batch_state(state_path: Path) -> List[Dict[str, Any]]:
+    """
+    Returns the batches a run submitted and has not finished collecting, each with its
+    batch id, input file id and custom_id -> cache path map.
+    """
+    if not state_path.exists():
+        return []
+    return json.loads(read_text_from_file(state_path)).get("batches", [])
+
+
+def save_batch_state(state_path: Path, batches: List[Dict[str, Any]]) -> None:
+    """Saves the outstanding batches, removing the state file once none are left."""
+    if batches:
+        write_text_atomic(state_path, json.dumps({"batches": batches}, ensure_ascii=False, indent=2))
+    else:
+        state_path.unlink(missing_ok=True)
 
 
-def find_file_in_subdirectories(base_dir: Path, relative_path: str) -> Optional[Path]:
+async def collect_batches(
+    batch_client: OpenAI,
+    state_path: Path,
+    state: List[Dict[str, Any]],
+    entries: List[Dict[str, Any]],
+    poll_interval: int = 30
+) -> Set[str]:
+    """
+    Waits for the given batches together. Each batch is dropped from the saved state once it has
+    finished and its output is downloaded; a failed download stays in the state for the next run.
+    Returns the custom_ids that succeeded.
+    """
+    async def collect(entry: Dict[str, Any]) -> Set[str]:
+        output_paths = {custom_id: Path(path) for custom_id, path in entry["output_paths"].items()}
+        try:
+            completed = await wait_for_batch(batch_client, entry["id"], output_paths, poll_interval)
+        except Exception as e:
+            logger.error(
+                f"Failed to download the output of OpenAI batch {entry['id']}: {e}. "
+                f"It will be resumed on the next run."
+            )
+            return set()
+        state.remove(entry)
+        save_batch_state(state_path, state)
+        return completed
+
+    results = await asyncio.gather(*(collect(entry) for entry in entries))
+    return set().union(*results)
+
+
+async def resume_batch_answers(openai_client: OpenAI, batch_input_path: Path, poll_interval: int = 30) -> Set[str]:
+    """
+    Finishes any batches an earlier, interrupted run submitted, writing their answers into the cache.
+    Returns the custom_ids that succeeded.
+    """
+    state_path = batch_input_path.with_suffix(".state.json")
+    state = load_batch_state(state_path)
+    if not state:
+        return set()
+    logger.info(f"Resuming {len(state)} OpenAI batch job(s) submitted by an earlier run.")
+    batch_client = openai_client.with_options(max_retries=BATCH_MAX_RETRIES)
+    return await collect_batches(batch_client, state_path, state, list(state), poll_interval)
+
+
+async def submit_batch_answers(
+    openai_client: OpenAI,
+    model: str,
+    prompts: Dict[str, str],
+    output_paths: Dict[str, Path],
+    batch_input_path: Path,
+    poll_interval: int = 30
+) -> Set[str]:
+    """
+    Submits the prompts as OpenAI Batch API jobs, split to stay under the per-batch limits,
+    and waits for all of them together.
+    Each submitted batch is recorded in a state file next to batch_input_path as soon as it is
+    created, so an interrupted run resumes it instead of submitting the requests again.
+    Each answer is written to output_paths[custom_id]; returns the custom_ids that succeeded.
+    """
+    batch_client = openai_client.with_options(max_retries=BATCH_MAX_RETRIES)
+    parts = write_batch_inputs(model, prompts, batch_input_path)
+    state_path = batch_input_path.with_suffix(".state.json")
+    state = load_batch_state(state_path)
+
+    submitted: List[Dict[str, Any]] = []
+    for part_path, custom_ids in parts:
+        try:
+            with open(part_path, "rb") as f:
+                batch_file = await asyncio.to_thread(batch_client.files.create, file=f, purpose="batch")
+            batch = await asyncio.to_thread(
+                batch_client.batches.create,
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        except Exception as e:
+            logger.error(f"Failed to submit OpenAI batch for {part_path.name}: {e}")
+            continue
+        logger.info(f"Submitted OpenAI batch {batch.id} (input file {batch_file.id}) with {len(custom_ids)} requests.")
+        entry = {
+            "id": batch.id,
+            "input_file_id": batch_file.id,
+            "output_paths": {custom_id: str(output_paths[custom_id]) for custom_id in custom_ids}
+        }
+        state.append(entry)
+        save_batch_state(state_path, state)
+        submitted.append(entry)
+
+    return await collect_batches(batch_client, state_path, state, submitted, poll_interval)
+
+
+def build_file_index(base_dir: Path) -> Dict[str, List[Path]]:
+    """
+    Walks base_dir once and returns a dict of file name -> every path with that name.
+    """
+    file_index = defaultdict(list)
+    for path in base_dir.rglob("*"):
+        if path.is_file():
+            file_index[path.name].append(path)
+    return file_index
+
+
+def find_file_in_subdirectories(
+    base_dir: Path,
+    relative_path: str,
+    file_index: Dict[str, List[Path]]
+) -> Optional[Path]:
     """
     Attempts to locate a file by its relative path in base_dir or its subdirectories.
     """
@@ -117,11 +603,7 @@ def find_file_in_subdirectories(base_dir: Path, relative_path: str) -> Optional[
     if possible_path.exists():
         return possible_path
 
-    target_name = Path(relative_path).name
-    for path in base_dir.rglob(target_name):
-        if path.is_file():
-            return path
-    return None
+    return file_index.get(Path(relative_path).name, [None])[0]
 
 
 def parse_questions(question_text: str) -> List[str]:
@@ -131,13 +613,14 @@ def parse_questions(question_text: str) -> List[str]:
     questions = []
     for line in question_text.splitlines():
         stripped = line.strip()
-        if not stripped:
+        # Cleaning only removes characters, so lines without a '?' can never be questions
+        if '?' not in stripped:
             continue
 
         # Remove leading numbering or bullets (like "1.", "-", "+", or "*")
-        cleaned = re.sub(r'^[\d\.\-\+\*]+\s*', '', stripped)
+        cleaned = LEADING_BULLET_PATTERN.sub('', stripped)
         # Remove extra asterisks used for formatting
-        cleaned = re.sub(r'\*+', '', cleaned).strip()
+        cleaned = ASTERISKS_PATTERN.sub('', cleaned).strip()
         if '?' in cleaned:
             questions.append(cleaned)
     return questions
@@ -154,46 +637,108 @@ def write_text_to_file(file_path: Path, text: str) -> None:
     file_path.write_text(text, encoding="utf-8")
 
 
+def write_text_atomic(file_path: Path, text: str) -> None:
+    """Writes text to a temporary file and moves it into place so readers never see partial content."""
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = file_path.with_name(f"{file_path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, file_path)
+
+
+def open_meta_db(meta_db_path: Path) -> sqlite3.Connection:
+    """
+    Opens the answer meta database, which stores the prompt hash of every saved answer.
+    """
+    conn = sqlite3.connect(meta_db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, group_name TEXT, hash TEXT)")
+    return conn
+
+
+def load_meta_hashes(meta_db_path: Path, group_name: str) -> Dict[str, str]:
+    """Returns the stored answer key -> prompt hash mapping for a group."""
+    conn = open_meta_db(meta_db_path)
+    try:
+        rows = conn.execute("SELECT key, hash FROM meta WHERE group_name = ?", (group_name,))
+        return dict(rows.fetchall())
+    finally:
+        conn.close()
+
+
+def save_meta_hashes(meta_db_path: Path, group_name: str, hashes: Dict[str, str]) -> None:
+    """Inserts or replaces the prompt hashes for a group's answers in a single transaction."""
+    conn = open_meta_db(meta_db_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, group_name, hash) VALUES (?, ?, ?)",
+                [(key, group_name, hash_value) for key, hash_value in hashes.items()]
+            )
+    finally:
+        conn.close()
+
+
 def read_text_from_file(file_path: Path) -> str:
     """Reads and returns text from a file."""
     return file_path.read_text(encoding="utf-8")
 
 
-def build_files_content(
+def read_files_content(
     file_list: List[str],
     base_dir: Path,
-    file_header_template: str
-) -> str:
+    file_index: Dict[str, List[Path]]
+) -> Dict[str, str]:
     """
-    Build a combined string by iterating over a list of files, 
-    inserting a file header and then the file contents.
+    Reads each file in the list once and returns a dict of relative path -> file contents.
+    Files that cannot be found are logged and left out.
     """
-    combined = ""
+    file_contents = {}
     for rel_path in file_list:
-        file_path = find_file_in_subdirectories(base_dir, rel_path)
+        file_path = find_file_in_subdirectories(base_dir, rel_path, file_index)
         if file_path and file_path.exists():
-            content = file_path.read_text(encoding="utf-8")
-            combined += file_header_template.format(file_name=rel_path) + "\n"
-            combined += content + "\n\n"
+            file_contents[rel_path] = file_path.read_text(encoding="utf-8")
         else:
             logger.warning(f"{rel_path} not found in {base_dir} or its subdirectories.")
-    return combined
+    return file_contents
+
+
+def build_files_content(
+    file_list: List[str],
+    file_contents: Dict[str, str],
+    file_header_template: str
+) -> str:
+    """
+    Build a combined string by iterating over a list of files, 
+    inserting a file header and then the file contents.
+    """
+    return "".join(
+        file_header_template.format(file_name=rel_path) + "\n" + file_contents[rel_path] + "\n\n"
+        for rel_path in file_list
+        if rel_path in file_contents
+    )
 
 
-def process_file_group(
+async def process_file_group(
     group_name: str,
-    group_config: Dict[str, Any],
+    group_config: FileGroupConfig,
     config: Dict[str, Any],
     full_base_dir: Path,
+    file_index: Dict[str, List[Path]],
     base_output_path: Path,
     question_provider_config: Dict[str, Any],
     answer_provider_config: Dict[str, Any],
     global_ollama_url: Optional[str],
     openai_client: Optional[OpenAI],
-    global_thread_count: int
-) -> None:
+    semaphore: asyncio.Semaphore,
+    existing_answer_files: Set[str]
+) -> Optional[Tuple[Dict[str, Tuple[str, Path]], Callable[[], None]]]:
     """
     Processes a group of files to generate questions and answers using the new config format.
+    existing_answer_files holds the names in the shared answers directory when the run started.
+    When answers go through the OpenAI Batch API they are not generated here: the group returns
+    its uncached answer requests (custom_id -> (prompt, cache path)) and a callback that saves
+    the answers once the run-wide batch has finished. Otherwise returns None.
     """
 
     # 1) Gather the relevant config sections/lists
@@ -205,17 +750,17 @@ def process_file_group(
     generate_question_lists = config.get("GenerateQuestionLists", [])
 
     # 2) Group-level info
-    file_list: List[str] = group_config.get("files", [])
-    file_header_name = group_config.get("file_header", "")
-    question_prompt_name = group_config.get("question_prompt", "")
-    answer_prompt_name = group_config.get("answer_prompt", "")
+    file_list = group_config.files
+    file_header_name = group_config.file_header
+    question_prompt_name = group_config.question_prompt
+    answer_prompt_name = group_config.answer_prompt
 
     # 2a) Instruction list names
-    question_instruction_list_names = group_config.get("question_instruction_list", [])
-    answer_instruction_list_names = group_config.get("answer_instruction_list", [])
+    question_instruction_list_names = group_config.question_instruction_list
+    answer_instruction_list_names = group_config.answer_instruction_list
 
     # 2b) Generate question list names
-    generate_question_list_names = group_config.get("generate_question_list", [])
+    generate_question_list_names = group_config.generate_question_list
 
     # 3) Resolve the actual template strings
     file_header_obj = get_item_by_name(file_headers, file_header_name)
@@ -260,28 +805,30 @@ def process_file_group(
         logger.warning(f"[Group: {group_name}] No question seeds or instructions found.")
         return
 
-    # 6) Build file content for the prompt (shared for question generation)
-    combined_file_content_for_questions = build_files_content(file_list, full_base_dir, file_header_template)
+    # 6) Read each file once and build the file content shared by question and answer prompts
+    file_contents = read_files_content(file_list, full_base_dir, file_index)
+    combined_file_content = build_files_content(file_list, file_contents, file_header_template)
+    file_name_list_str = ", ".join(file_list)
 
     # 7) Prepare output directories
     output_dir = base_output_path / "qa_generation_output"
     questions_dir = output_dir / "questions"
     answers_dir = output_dir / "answers"
     debug_dir = output_dir / "debug"
+    cache_dir = output_dir / ".llm_cache"
     questions_dir.mkdir(parents=True, exist_ok=True)
     answers_dir.mkdir(parents=True, exist_ok=True)
     debug_dir.mkdir(parents=True, exist_ok=True)
 
     # 8) We'll generate questions for each (question_seed, question_instruction)
-    def generate_questions(q_seed_idx: int, instr_idx: int, seed_text: str, instruction: str):
+    async def generate_questions(q_seed_idx: int, instr_idx: int, seed_text: str, instruction: str):
         """
         Generate a block of questions from a single question seed + instruction pair.
         Return the text as well as the parsed list of questions.
         """
         # Format the final question prompt
-        file_name_list_str = ", ".join(file_list)
         final_question_prompt = question_prompt_template.format(
-            file_content=combined_file_content_for_questions,
+            file_content=combined_file_content,
             generate_question=seed_text,
             instruction=instruction,
             file_name_list=file_name_list_str
@@ -297,20 +844,24 @@ def process_file_group(
             question_list_text = read_text_from_file(questions_path).strip()
             logger.info(f"[Group: {group_name}] Using existing questions file: {out_filename}")
         else:
-            # Call the LLM
-            question_list_text = call_api(
+            # Call the LLM, streaming the questions straight to disk
+            generated = await cached_call_api(
                 provider=question_provider_config.get("provider"),
                 model=question_provider_config.get("model"),
                 prompt=final_question_prompt,
+                output_path=questions_path,
+                semaphore=semaphore,
+                cache_dir=cache_dir,
+                namespace=group_name,
                 global_ollama_url=global_ollama_url,
                 openai_client=openai_client
             )
-            if not question_list_text:
+            if not generated:
                 logger.error(f"[Group: {group_name}] Failed to generate questions (seed={q_seed_idx}, instr={instr_idx}).")
                 return ""
 
             # Save outputs
-            write_text_to_file(questions_path, question_list_text)
+            question_list_text = read_text_from_file(questions_path).strip()
             write_text_to_file(debug_path, final_question_prompt)
 
         return question_list_text
@@ -321,37 +872,27 @@ def process_file_group(
         for instr_idx, instruction in enumerate(all_question_instructions, start=1):
             question_generation_tasks.append((q_seed_idx, instr_idx, seed_text, instruction))
 
-    # Decide how many workers to use
-    inner_workers = global_thread_count if global_thread_count > 1 else 1
-
     # We'll store (seed_idx, instr_idx) -> [questions]
     question_collections: Dict[(int, int), List[str]] = {}
 
-    def handle_question_generation_task(task_tuple):
-        q_seed_idx, instr_idx, seed_text, instruction = task_tuple
-        text_block = generate_questions(q_seed_idx, instr_idx, seed_text, instruction)
-        if not text_block:
-            return (q_seed_idx, instr_idx, [])
-        parsed_list = parse_questions(text_block)
-        return (q_seed_idx, instr_idx, parsed_list)
-
-    # Generate questions concurrently or sequentially
-    if inner_workers > 1:
-        with ThreadPoolExecutor(max_workers=inner_workers) as pool:
-            future_map = {pool.submit(handle_question_generation_task, t): t for t in question_generation_tasks}
-            for f in as_completed(future_map):
-                (q_seed_idx, instr_idx, q_list) = f.result()
-                question_collections[(q_seed_idx, instr_idx)] = q_list
-    else:
-        for t in question_generation_tasks:
-            q_seed_idx, instr_idx, q_list = handle_question_generation_task(t)
-            question_collections[(q_seed_idx, instr_idx)] = q_list
+    # Generate questions concurrently
+    question_texts = await asyncio.gather(*(generate_questions(*t) for t in question_generation_tasks))
+
+    for (q_seed_idx, instr_idx, _, _), text_block in zip(question_generation_tasks, question_texts):
+        question_collections[(q_seed_idx, instr_idx)] = parse_questions(text_block)
 
     # --- ANSWER GENERATION ---
-    # Build file content again for answers
-    combined_file_content_for_answers = build_files_content(file_list, full_base_dir, file_header_template)
+    # Prompt hashes live in one SQLite database instead of a .meta file per answer
+    meta_db_path = answers_dir / "meta.sqlite"
+    stored_hashes = load_meta_hashes(meta_db_path, group_name)
+    new_hashes: Dict[str, str] = {}
+    # .meta files left by earlier runs, removed once their hashes are in the database
+    legacy_meta_paths: List[Path] = []
+
+    # Each answer instruction's short hash is used in many filenames, so compute it once
+    answer_instruction_hashes = {instr: get_hash(instr)[:8] for instr in all_answer_instructions}
 
-    def generate_answer(
+    def prepare_answer(
         q_seed_idx: int,
         instr_idx: int,
         question_number: int,
@@ -359,70 +900,65 @@ def process_file_group(
         answer_instruction: str
     ):
         """
-        Generate an answer to a single question with a single answer instruction.
+        Build the answer prompt for a single question with a single answer instruction.
+        Returns None if the existing answer is up to date, otherwise the pending answer tuple.
         """
         # The answer prompt might have placeholders:
         final_answer_prompt = answer_prompt_template.format(
-            file_content=combined_file_content_for_answers,
+            file_content=combined_file_content,
             instruction=answer_instruction,
             question=question_text
         )
         
         # Incorporate a short hash of the answer_instruction into the filenames
-        ans_instr_hash = get_hash(answer_instruction)[:8]
-        answer_filename = f"answer_{group_name}_seed{q_seed_idx}_instr{instr_idx}_q{question_number}_{ans_instr_hash}.txt"
+        ans_instr_hash = answer_instruction_hashes[answer_instruction]
+        answer_id = f"{group_name}_seed{q_seed_idx}_instr{instr_idx}_q{question_number}_{ans_instr_hash}"
+        answer_filename = f"answer_{answer_id}.txt"
         debug_filename = f"debug_{group_name}_answer_seed{q_seed_idx}_instr{instr_idx}_q{question_number}_{ans_instr_hash}.txt"
-        meta_filename = f"answer_{group_name}_seed{q_seed_idx}_instr{instr_idx}_q{question_number}_{ans_instr_hash}.meta"
 
         answer_file_path = answers_dir / answer_filename
         answer_debug_path = debug_dir / debug_filename
-        meta_file_path = answers_dir / meta_filename
 
         # Compute a hash of the fully formatted answer prompt to capture all relevant changes
         current_hash = get_hash(final_answer_prompt)
 
         # Determine if we regenerate
-        regenerate = True
-        if answer_file_path.exists():
-            if meta_file_path.exists():
-                stored_hash = read_text_from_file(meta_file_path).strip()
-                if stored_hash == current_hash:
-                    logger.info(
-                        f"[Group: {group_name}] Answer for (seed={q_seed_idx}, instr={instr_idx}, q={question_number}) is up to date."
-                    )
-                    regenerate = False
-                else:
-                    logger.info(f"[Group: {group_name}] Detected changed question/instruction, regenerating answer.")
-            else:
-                # If there's no meta file, create one now and assume it is up-to-date
-                write_text_to_file(meta_file_path, current_hash)
-                regenerate = False
+        if answer_filename in existing_answer_files:
+            stored_hash = stored_hashes.get(answer_id)
+            legacy_meta_filename = f"answer_{answer_id}.meta"
+            if stored_hash is None and legacy_meta_filename in existing_answer_files:
+                # Import the hash from a .meta file written before the database existed
+                legacy_meta_path = answers_dir / legacy_meta_filename
+                stored_hash = read_text_from_file(legacy_meta_path).strip()
+                new_hashes[answer_id] = stored_hash
+                legacy_meta_paths.append(legacy_meta_path)
+            if stored_hash is None:
+                # If there's no stored hash, record one now and assume it is up-to-date
+                new_hashes[answer_id] = current_hash
+                return None
+            if stored_hash == current_hash:
+                logger.info(
+                    f"[Group: {group_name}] Answer for (seed={q_seed_idx}, instr={instr_idx}, q={question_number}) is up to date."
+                )
+                return None
+            logger.info(f"[Group: {group_name}] Detected changed question/instruction, regenerating answer.")
 
-        if not regenerate:
-            return
+        return (answer_id, final_answer_prompt, current_hash, answer_file_path, answer_debug_path)
 
-        # Actually generate
-        answer_text = call_api(
-            provider=answer_provider_config.get("provider"),
-            model=answer_provider_config.get("model"),
-            prompt=final_answer_prompt,
-            global_ollama_url=global_ollama_url,
-            openai_client=openai_client
-        )
-        if not answer_text:
-            logger.error(
-                f"[Group: {group_name}] Failed to generate answer for (seed={q_seed_idx}, instr={instr_idx}, q={question_number})."
-            )
+    def save_answer(pending_answer, generated: bool) -> None:
+        """
+        Save the debug prompt and meta hash for an answer that was written to disk.
+        """
+        answer_id, final_answer_prompt, current_hash, answer_file_path, answer_debug_path = pending_answer
+        if not generated:
+            logger.error(f"[Group: {group_name}] Failed to generate answer for {answer_id}.")
             return
 
         # Save outputs
-        write_text_to_file(answer_file_path, answer_text)
         write_text_to_file(answer_debug_path, final_answer_prompt)
-        write_text_to_file(meta_file_path, current_hash)
+        new_hashes[answer_id] = current_hash
         logger.info(f"[Group: {group_name}] Saved answer -> {answer_file_path}")
 
-
-
     # Prepare tasks for answer-generation
     answer_tasks = []
     for (q_seed_idx, instr_idx), question_list in question_collections.items():
@@ -433,17 +969,209 @@ def process_file_group(
             for ans_instr in all_answer_instructions:
                 answer_tasks.append((q_seed_idx, instr_idx, q_num, q_text, ans_instr))
 
-    def handle_answer_task(task_tuple):
-        q_seed_idx, instr_idx, question_number, question_text, answer_instruction = task_tuple
-        generate_answer(q_seed_idx, instr_idx, question_number, question_text, answer_instruction)
+    # Only answers that are missing or out of date need generating
+    pending_answers = [p for p in (prepare_answer(*t) for t in answer_tasks) if p]
+
+    answer_provider = answer_provider_config.get("provider", "")
+    answer_model = answer_provider_config.get("model")
+    use_batch = answer_provider.lower() == "openai" and answer_provider_config.get("batch", False)
+    prompts_per_request = answer_provider_config.get("prompts_per_request", 1)
+
+    def answer_cache_path(pending_answer) -> Path:
+        return get_cache_path(cache_dir, answer_provider, answer_model, group_name, pending_answer[1])
+
+    def save_cached_answer(pending_answer, cache_path: Path) -> None:
+        # Copy a response that was written into the cache out to the answer file
+        generated = cache_path.exists()
+        if generated:
+            shutil.copyfile(cache_path, pending_answer[3])
+        save_answer(pending_answer, generated)
+
+    def finish_answers() -> None:
+        # Record the prompt hashes of every answer saved or adopted in this group
+        if new_hashes:
+            save_meta_hashes(meta_db_path, group_name, new_hashes)
+        for legacy_meta_path in legacy_meta_paths:
+            legacy_meta_path.unlink(missing_ok=True)
+
+    async def handle_answer_chunk(chunk):
+        # Send several answer prompts in one request, writing the responses into the cache
+        await batch_call_api(
+            model=answer_model,
+            prompts=[prompt for prompt, _ in chunk],
+            output_paths=[cache_path for _, cache_path in chunk],
+            semaphore=semaphore,
+            openai_client=openai_client,
+            max_tokens=answer_provider_config.get("max_tokens", DEFAULT_COMPLETION_MAX_TOKENS)
+        )
+
+    async def handle_answer_task(pending_answer):
+        generated = await cached_call_api(
+            provider=answer_provider,
+            model=answer_model,
+            prompt=pending_answer[1],
+            output_path=pending_answer[3],
+            semaphore=semaphore,
+            cache_dir=cache_dir,
+            namespace=group_name,
+            global_ollama_url=global_ollama_url,
+            openai_client=openai_client
+        )
+        save_answer(pending_answer, generated)
 
     # Run answer tasks
-    if inner_workers > 1:
-        with ThreadPoolExecutor(max_workers=inner_workers) as pool:
-            _ = list(as_completed(pool.submit(handle_answer_task, t) for t in answer_tasks))
+    if prompts_per_request > 1 and answer_provider.lower() == "openai":
+        # Identical prompts share a cache path, so each uncached path is only sent once
+        cache_paths = {p[0]: answer_cache_path(p) for p in pending_answers}
+        uncached_prompts: Dict[Path, str] = {}
+        for pending_answer in pending_answers:
+            cache_path = cache_paths[pending_answer[0]]
+            if not cache_path.exists():
+                uncached_prompts.setdefault(cache_path, pending_answer[1])
+        uncached = [(prompt, cache_path) for cache_path, prompt in uncached_prompts.items()]
+        chunks = [
+            uncached[i:i + prompts_per_request]
+            for i in range(0, len(uncached), prompts_per_request)
+        ]
+        await asyncio.gather(*(handle_answer_chunk(c) for c in chunks))
+        for pending_answer in pending_answers:
+            save_cached_answer(pending_answer, cache_paths[pending_answer[0]])
+    elif use_batch and pending_answers:
+        # Answers already in the cache don't need to be submitted again, and identical
+        # prompts share a cache path, so each uncached path becomes one batch request.
+        # answer_id starts with the group name, so it is unique across the run-wide batch.
+        cache_paths = {p[0]: answer_cache_path(p) for p in pending_answers}
+        batch_requests: Dict[str, Tuple[str, Path]] = {}
+        requested_paths: Set[Path] = set()
+        for pending_answer in pending_answers:
+            cache_path = cache_paths[pending_answer[0]]
+            if not cache_path.exists() and cache_path not in requested_paths:
+                requested_paths.add(cache_path)
+                batch_requests[pending_answer[0]] = (pending_answer[1], cache_path)
+
+        def finish_batch_answers() -> None:
+            # Batch results are written straight into the cache
+            for pending_answer in pending_answers:
+                save_cached_answer(pending_answer, cache_paths[pending_answer[0]])
+            finish_answers()
+
+        return batch_requests, finish_batch_answers
     else:
-        for t in answer_tasks:
-            handle_answer_task(t)
+        await asyncio.gather(*(handle_answer_task(p) for p in pending_answers))
+
+    finish_answers()
+    return None
+
+
+async def run_file_groups(
+    expanded_file_groups: Dict[str, FileGroupConfig],
+    config: Dict[str, Any],
+    full_base_dir: Path,
+    file_index: Dict[str, List[Path]],
+    base_output_path: Path,
+    question_provider_config: Dict[str, Any],
+    answer_provider_config: Dict[str, Any],
+    global_ollama_url: Optional[str],
+    openai_client: Optional[OpenAI],
+    global_thread_count: int
+) -> None:
+    """
+    Runs every file group on a single event loop, sharing one pooled HTTP client for Ollama,
+    one thread pool for the synchronous OpenAI client and one bound on in-flight requests.
+    With the OpenAI Batch API, every group's questions are generated first and all of their
+    pending answers are then submitted as a single batch job.
+    """
+    global http_client
+    httpx = get_httpx()
+    thread_count = max(global_thread_count, 1)
+
+    # Blocking OpenAI calls run via asyncio.to_thread, so size the default executor to match
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=thread_count))
+
+    # A single bound shared by every group keeps total concurrency at --threads
+    semaphore = asyncio.BoundedSemaphore(thread_count)
+
+    http_client = httpx.AsyncClient(
+        timeout=None,
+        headers={"Connection": "keep-alive"},
+        limits=httpx.Limits(
+            max_connections=thread_count,
+            max_keepalive_connections=thread_count
+        )
+    )
+
+    try:
+        # Pre-warm the connection pool so the first requests skip the TCP handshake
+        if "ollama" in (
+            question_provider_config.get("provider", "").lower(),
+            answer_provider_config.get("provider", "").lower()
+        ):
+            try:
+                await http_client.head(global_ollama_url)
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not reach Ollama at {global_ollama_url}: {e}")
+
+        # Bound how many groups run at once
+        group_semaphore = asyncio.Semaphore(thread_count)
+
+        # Every group writes to the same answers directory, so list it once for the whole run
+        # rather than once per group. Answer filenames start with the group name, so each group
+        # only ever looks up its own entries.
+        answers_dir = base_output_path / "qa_generation_output" / "answers"
+        answers_dir.mkdir(parents=True, exist_ok=True)
+        with os.scandir(answers_dir) as entries:
+            existing_answer_files = {entry.name for entry in entries}
+
+        # Finish any batches an interrupted run left behind first, so their answers are served
+        # from the cache below instead of being submitted and paid for again
+        batch_input_path = base_output_path / "qa_generation_output" / "batches" / "batch_answers.jsonl"
+        if openai_client:
+            await resume_batch_answers(openai_client, batch_input_path)
+
+        # Answer requests deferred to the run-wide batch, and the callbacks that save them per group
+        batch_requests: Dict[str, Tuple[str, Path]] = {}
+        batch_finishers: List[Callable[[], None]] = []
+
+        async def run_group(group_name: str, group_conf: FileGroupConfig) -> None:
+            async with group_semaphore:
+                deferred_answers = await process_file_group(
+                    group_name=group_name,
+                    group_config=group_conf,
+                    config=config,
+                    full_base_dir=full_base_dir,
+                    file_index=file_index,
+                    base_output_path=base_output_path,
+                    question_provider_config=question_provider_config,
+                    answer_provider_config=answer_provider_config,
+                    global_ollama_url=global_ollama_url,
+                    openai_client=openai_client,
+                    semaphore=semaphore,
+                    existing_answer_files=existing_answer_files
+                )
+            if deferred_answers:
+                group_requests, finish_group = deferred_answers
+                batch_requests.update(group_requests)
+                batch_finishers.append(finish_group)
+
+        # Raise exceptions if any occurred
+        await asyncio.gather(*(run_group(name, conf) for name, conf in expanded_file_groups.items()))
+
+        # Submit every group's pending answers as one batch job, then map the results back per group
+        if batch_requests:
+            if not openai_client:
+                logger.error("OpenAI client is not initialized. Cannot generate via openai provider.")
+            else:
+                await submit_batch_answers(
+                    openai_client=openai_client,
+                    model=answer_provider_config.get("model"),
+                    prompts={custom_id: prompt for custom_id, (prompt, _) in batch_requests.items()},
+                    output_paths={custom_id: path for custom_id, (_, path) in batch_requests.items()},
+                    batch_input_path=batch_input_path
+                )
+        for finish_group in batch_finishers:
+            finish_group()
+    finally:
+        await http_client.aclose()
 
 
 def main() -> None:
@@ -458,7 +1186,13 @@ def main() -> None:
         return
 
     # Load the main config
-    config = yaml.safe_load(config_path.read_text(encoding="utf-8"))
+    # Prefer the libYAML-backed loader when PyYAML was built with it
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    config = yaml.load(config_path.read_bytes(), Loader=loader)
+    if not isinstance(config, dict):
+        logger.error(f"Configuration file is empty or not a mapping: {config_path}")
+        return
 
     # Global settings
     global_config = config.get("global", {})
@@ -470,6 +1204,11 @@ def main() -> None:
     # Providers
     question_provider_config = config.get("providers", {}).get("question", {})
     answer_provider_config = config.get("providers", {}).get("answer", {})
+    if (
+        answer_provider_config.get("prompts_per_request", 1) > 1
+        and answer_provider_config.get("provider", "").lower() != "openai"
+    ):
+        logger.warning("prompts_per_request only applies to the openai provider and will be ignored.")
 
     # Initialize an OpenAI client if needed
     openai_client = None
@@ -477,49 +1216,61 @@ def main() -> None:
         question_provider_config.get("provider", "").lower() == "openai"
         or answer_provider_config.get("provider", "").lower() == "openai"
     ):
+        OpenAI = get_openai_class()
         if OpenAI is None:
             logger.error("OpenAI client cannot be initialized because the package is missing.")
         else:
-            # Create a single client, referencing your example usage
+            from openai import DefaultHttpxClient
+
+            # Create a single client whose keep-alive pool matches the thread count.
+            # Retries are handled by call_api_async, so the client's own retries are disabled
+            # (submit_batch_answers turns them back on for the Batch API calls).
             api_key = os.environ.get("OPENAI_API_KEY")
-            openai_client = OpenAI(api_key=api_key)
+            thread_count = max(args.threads, 1)
+            openai_client = OpenAI(
+                api_key=api_key,
+                max_retries=0,
+                http_client=DefaultHttpxClient(
+                    limits=get_httpx().Limits(
+                        max_connections=thread_count,
+                        max_keepalive_connections=thread_count
+                    )
+                )
+            )
 
     # File groups
     file_groups_config = config.get("file_groups", {})
 
-    # Expand file groups by 'iterations'
+    # Validate each file group once and expand it by 'iterations'
     expanded_file_groups = {}
-    for group_name, g_config in file_groups_config.items():
-        iterations = g_config.get("iterations", 1)
-        for i in range(1, iterations + 1):
+    for group_name, raw_group_config in file_groups_config.items():
+        try:
+            g_config = FileGroupConfig.from_dict(group_name, raw_group_config)
+        except ValueError as e:
+            logger.error(f"Invalid configuration: {e}")
+            return
+        for i in range(1, g_config.iterations + 1):
             key = f"{group_name}_{i}"
             expanded_file_groups[key] = g_config
 
+    # Index the input tree once instead of searching it for every file of every group
+    file_index = build_file_index(full_base_dir)
+
     total_groups = len(expanded_file_groups)
     logger.info(f"Starting processing of {total_groups} file groups with up to {args.threads} threads...")
 
-    # Use a thread pool for the groups
-    with ThreadPoolExecutor(max_workers=args.threads) as executor:
-        futures = []
-        for group_name, group_conf in expanded_file_groups.items():
-            future = executor.submit(
-                process_file_group,
-                group_name=group_name,
-                group_config=group_conf,
-                config=config,
-                full_base_dir=full_base_dir,
-                base_output_path=output_base_path,
-                question_provider_config=question_provider_config,
-                answer_provider_config=answer_provider_config,
-                global_ollama_url=global_ollama_url,
-                openai_client=openai_client,
-                global_thread_count=args.threads
-            )
-            futures.append(future)
-
-        for future in as_completed(futures):
-            # Raise exceptions if any occurred
-            future.result()
+    asyncio.run(run_file_groups(
+        expanded_file_groups=expanded_file_groups,
+        config=config,
+        full_base_dir=full_base_dir,
+        file_index=file_index,
+        base_output_path=output_base_path,
+        question_provider_config=question_provider_config,
+        answer_provider_config=answer_provider_config,
+        global_ollama_url=global_ollama_url,
+        openai_client=openai_client,
+        global_thread_count=args.threads
+    ))
 
     logger.info("All file groups have been processed successfully.")
 
@@ -1,109 +1,170 @@
 import os
 import json
 import re
-import glob
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# orjson serializes much faster; fall back to the standard json module if it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Adjust these paths as needed.
 BASE_OUTPUT_DIR = "/var/kolo_data/qa_generation_output"
 QUESTIONS_DIR = os.path.join(BASE_OUTPUT_DIR, "questions")
 ANSWERS_DIR = os.path.join(BASE_OUTPUT_DIR, "answers")
 OUTPUT_FILE = "/app/data.jsonl"
+MAX_WORKERS = 32
+
+# Patterns used to clean question lines, compiled once
+LEADING_BULLET_PATTERN = re.compile(r'^[\d\.\-\+\*]+\s*')
+ASTERISKS_PATTERN = re.compile(r'\*+')
 
 def parse_questions_from_file(filepath: str) -> List[str]:
     """
     Reads file content and extracts question texts from a wide range of formats.
-    Processes the file line by line, removing numbering, bullet symbols, and markdown formatting,
-    and only returns lines containing a '?'.
+    Streams the file line by line instead of reading it whole, removing numbering, bullet symbols,
+    and markdown formatting, and only returns lines containing a '?'.
     """
+    questions = []
     with open(filepath, 'r', encoding='utf-8') as f:
-        text = f.read()
+        for raw_line in f:
+            # splitlines() matches how generate_qa_data.py numbers questions, which also
+            # breaks on rarer separators (e.g. form feeds) that file iteration keeps inside a line.
+            for line in raw_line.splitlines():
+                stripped = line.strip()
+                # Cleaning only removes characters, so lines without a '?' can never be questions
+                if '?' not in stripped:
+                    continue
+
+                # Remove leading numbering or bullet symbols (like "1.", "-", "+", or "*")
+                cleaned = LEADING_BULLET_PATTERN.sub('', stripped)
+                # Remove extra asterisks used for markdown formatting
+                cleaned = ASTERISKS_PATTERN.sub('', cleaned).strip()
+
+                if '?' in cleaned:
+                    questions.append(cleaned)
 
-    questions = []
-    for line in text.splitlines():
-        stripped = line.strip()
-        if not stripped:
+    return questions
+
+def to_json_bytes(obj: Any) -> bytes:
+    """
+    Serializes an object to UTF-8 encoded JSON, using orjson when available.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def build_answer_index() -> Dict[str, List[str]]:
+    """
+    Scans ANSWERS_DIR once and maps each answer prefix (the filename without its
+    trailing instruction hash) to the matching answer filenames.
+    """
+    answer_index = {}
+    with os.scandir(ANSWERS_DIR) as entries:
+        for entry in entries:
+            if not (entry.name.startswith("answer_") and entry.name.endswith(".txt")):
+                continue
+            prefix = entry.name[:-len(".txt")].rsplit("_", 1)[0]
+            answer_index.setdefault(prefix, []).append(entry.name)
+
+    # Directory order is arbitrary, so sort to pick the same answer file on every run
+    for filenames in answer_index.values():
+        filenames.sort()
+    return answer_index
+
+def process_question_file(q_filename: str, answer_index: Dict[str, List[str]]) -> Optional[Tuple[str, List[dict], dict]]:
+    """
+    Pairs every question in a single question file with its answer.
+    Returns (identifier, qa_pairs, stats), or None if the filename doesn't match the convention.
+    """
+    # Expect filenames like: questions_{group_name}_seed{q_seed_idx}_instr{instr_idx}.txt
+    m = re.match(r"questions_(.+)_seed(\d+)_instr(\d+)\.txt", q_filename)
+    if not m:
+        return None
+
+    group_name = m.group(1)
+    q_seed_idx = m.group(2)
+    instr_idx = m.group(3)
+    identifier = f"{group_name}_seed{q_seed_idx}_instr{instr_idx}"
+    q_filepath = os.path.join(QUESTIONS_DIR, q_filename)
+    questions = parse_questions_from_file(q_filepath)
+
+    qa_pairs = []
+    stats = {'questions': len(questions), 'answers': 0}
+
+    # For each question, look up the corresponding answer files in the pre-scanned index.
+    # Expected answer file format: answer_{group_name}_seed{q_seed_idx}_instr{instr_idx}_q{idx}_{hash}.txt
+    for idx, question in enumerate(questions, start=1):
+        matching_files = answer_index.get(f"answer_{identifier}_q{idx}")
+        if not matching_files:
+            print(f"Warning: No answer file found for identifier {identifier}, question {idx}.")
             continue
 
-        # Remove leading numbering or bullet symbols (like "1.", "-", "+", or "*")
-        cleaned = re.sub(r'^[\d\.\-\+\*]+\s*', '', stripped)
-        # Remove extra asterisks used for markdown formatting
-        cleaned = re.sub(r'\*+', '', cleaned).strip()
+        # If more than one file matches, you might decide how to handle it.
+        # Here, we take the first match.
+        answer_filepath = os.path.join(ANSWERS_DIR, matching_files[0])
+        with open(answer_filepath, 'r', encoding='utf-8') as af:
+            answer = af.read().strip()
 
-        if '?' in cleaned:
-            questions.append(cleaned)
+        qa_pair = {
+            "messages": [
+                {"role": "user", "content": question},
+                {"role": "assistant", "content": answer}
+            ]
+        }
+        qa_pairs.append(qa_pair)
+        stats['answers'] += 1
 
-    return questions
+    return identifier, qa_pairs, stats
 
-def pair_questions_and_answers():
+def pair_questions_and_answers(group_stats: Dict[str, dict]) -> Iterator[dict]:
     """
     Looks for all question files in the QUESTIONS_DIR and then for each question,
     pairs it with the corresponding answer file from ANSWERS_DIR.
+    Question files are read in parallel since the work is purely I/O bound.
+    Pairs are yielded as soon as they are formed; per-identifier counts are recorded in group_stats.
 
     Assumes the new naming convention:
       - Questions: questions_{group_name}_seed{q_seed_idx}_instr{instr_idx}.txt
       - Answers:   answer_{group_name}_seed{q_seed_idx}_instr{instr_idx}_q{question_number}_{hash}.txt
     """
-    qa_pairs = []
-    group_stats = {}  # { identifier: {'questions': count, 'answers': count} }
-
-    # Process each question file.
-    for q_filename in os.listdir(QUESTIONS_DIR):
-        # Expect filenames like: questions_{group_name}_seed{q_seed_idx}_instr{instr_idx}.txt
-        m = re.match(r"questions_(.+)_seed(\d+)_instr(\d+)\.txt", q_filename)
-        if not m:
-            continue
-
-        group_name = m.group(1)
-        q_seed_idx = m.group(2)
-        instr_idx = m.group(3)
-        identifier = f"{group_name}_seed{q_seed_idx}_instr{instr_idx}"
-        q_filepath = os.path.join(QUESTIONS_DIR, q_filename)
-        questions = parse_questions_from_file(q_filepath)
-
-        # Initialize stats for this identifier.
-        group_stats[identifier] = {'questions': len(questions), 'answers': 0}
-
-        # For each question, look for a corresponding answer file using a glob pattern.
-        # Expected answer file format: answer_{group_name}_seed{q_seed_idx}_instr{instr_idx}_q{idx}_{hash}.txt
-        for idx, question in enumerate(questions, start=1):
-            pattern = os.path.join(
-                ANSWERS_DIR,
-                f"answer_{group_name}_seed{q_seed_idx}_instr{instr_idx}_q{idx}_*.txt"
+    answer_index = build_answer_index()
+    with os.scandir(QUESTIONS_DIR) as entries:
+        q_filenames = sorted(entry.name for entry in entries if entry.name.startswith("questions_"))
+
+    # Process the question files in windows so only a bounded number of results wait in memory.
+    window = MAX_WORKERS * 2
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for start in range(0, len(q_filenames), window):
+            results = executor.map(
+                lambda name: process_question_file(name, answer_index),
+                q_filenames[start:start + window]
             )
-            matching_files = glob.glob(pattern)
-            if not matching_files:
-                print(f"Warning: No answer file found for identifier {identifier}, question {idx}.")
-                continue
-
-            # If more than one file matches, you might decide how to handle it.
-            # Here, we take the first match.
-            answer_filepath = matching_files[0]
-            with open(answer_filepath, 'r', encoding='utf-8') as af:
-                answer = af.read().strip()
-
-            qa_pair = {
-                "messages": [
-                    {"role": "user", "content": question},
-                    {"role": "assistant", "content": answer}
-                ]
-            }
-            qa_pairs.append(qa_pair)
-            group_stats[identifier]['answers'] += 1
-
-    return qa_pairs, group_stats
+            for result in results:
+                if result is None:
+                    continue
+                identifier, pairs, stats = result
+                group_stats[identifier] = stats
+                yield from pairs
 
 def main():
-    qa_pairs, group_stats = pair_questions_and_answers()
+    group_stats = {}  # { identifier: {'questions': count, 'answers': count} }
+    total_pairs = 0
+
+    # Write each pair as it is formed; the file only replaces OUTPUT_FILE if any pairs were found.
+    tmp_output_file = OUTPUT_FILE + ".tmp"
+    with open(tmp_output_file, 'wb') as out_f:
+        for pair in pair_questions_and_answers(group_stats):
+            out_f.write(to_json_bytes(pair) + b"\n")
+            total_pairs += 1
 
-    if not qa_pairs:
+    if not total_pairs:
+        os.remove(tmp_output_file)
         print("No QA pairs found.")
         return
-
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as out_f:
-        for pair in qa_pairs:
-            json_line = json.dumps(pair, ensure_ascii=False)
-            out_f.write(json_line + "\n")
+    os.replace(tmp_output_file, OUTPUT_FILE)
 
     # Print summary statistics.
     total_questions = 0
@@ -115,7 +176,7 @@ def main():
         print(f"  Identifier '{identifier}': {stats['questions']} questions, {stats['answers']} answers processed.")
 
     print(f"Total: {total_questions} questions and {total_answers} answers processed.")
-    print(f"Total pairs saved to {OUTPUT_FILE}: {len(qa_pairs)}")
+    print(f"Total pairs saved to {OUTPUT_FILE}: {total_pairs}")
 
 if __name__ == "__main__":
     main()